@@ -4,18 +4,93 @@ WMT Client Deployment Script
 Deploys to Lightsail (SSH) and/or IONOS (SFTP)
 """
 
+import asyncio
+import atexit
+import json
 import os
 import sys
 import re
+import shutil
 import subprocess
 import argparse
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timezone
 
 # Base directory
 BASE_DIR = Path(__file__).parent
 
+# Remote hosts and keys (one place to look, and one place the SSH
+# multiplexing helpers iterate over)
+LIGHTSAIL_HOST = '3.14.128.194'
+LIGHTSAIL_KEY = Path.home() / '.ssh' / 'wmt-client-socket.pem'
+TEST_HOST = '18.225.235.28'
+TEST_KEY = Path.home() / '.ssh' / 'test-mud.pem'
+
+
+def _ssh_opts(ssh_key, connect_timeout=None):
+    """Common ssh/scp options (argv form), shared by every remote call.
+
+    Uses ControlMaster multiplexing so repeated ssh/scp calls to the same
+    host reuse one TCP+auth handshake (a deploy makes ~10 remote calls).
+    Windows OpenSSH doesn't support ControlMaster, so skip it there.
+    """
+    # -C: the payloads are text (JS), ~3-5x zlib ratio. Prefer AES-GCM —
+    # with AES-NI it's much cheaper than the chacha20 default.
+    # Keepalives bound how long a silently-dead connection can hang a
+    # blocking read (4 missed probes at 15s = ~60s worst case).
+    opts = ['-i', str(ssh_key), '-o', 'StrictHostKeyChecking=no', '-C',
+            '-c', 'aes128-gcm@openssh.com,aes256-gcm@openssh.com,aes128-ctr,aes256-ctr',
+            '-o', 'ServerAliveInterval=15', '-o', 'ServerAliveCountMax=4']
+    if connect_timeout:
+        opts += ['-o', f'ConnectTimeout={connect_timeout}']
+    if sys.platform != 'win32':
+        opts += ['-o', 'ControlMaster=auto', '-o', 'ControlPath=~/.ssh/cm-%r@%h:%p',
+                 '-o', 'ControlPersist=600s']
+    return opts
+
+
+def _ssh_cmd(ssh_key, host, connect_timeout=None):
+    """argv prefix for a remote command: _ssh_cmd(...) + [remote_command]"""
+    return ['ssh'] + _ssh_opts(ssh_key, connect_timeout) + [f'ubuntu@{host}']
+
+
+def _scp_cmd(ssh_key, local_file, remote_path, host, connect_timeout=None):
+    """argv for copying a local file to ubuntu@host:remote_path"""
+    return (['scp'] + _ssh_opts(ssh_key, connect_timeout)
+            + [str(local_file), f'ubuntu@{host}:{remote_path}'])
+
+
+def _open_ssh_masters():
+    """Pre-open one master connection per deploy host so every later
+    ssh/scp call multiplexes over it instead of re-handshaking.
+
+    Masters are left running (ControlPersist keeps them alive for 10
+    minutes of idle), so back-to-back deploy runs skip auth entirely."""
+    if sys.platform == 'win32':
+        return
+    for ssh_key, host in [(LIGHTSAIL_KEY, LIGHTSAIL_HOST), (TEST_KEY, TEST_HOST)]:
+        if not ssh_key.exists():
+            continue
+        # A previous run may have left a live master behind. Spawning
+        # another `-Nf` against it would just fork a mux client that
+        # lingers (and pins the master past its idle timeout), so only
+        # open a new master when the probe says there isn't one.
+        check = subprocess.run(
+            ['ssh'] + _ssh_opts(ssh_key) + ['-O', 'check', f'ubuntu@{host}'],
+            capture_output=True, text=True
+        )
+        if check.returncode == 0:
+            continue
+        subprocess.run(
+            ['ssh'] + _ssh_opts(ssh_key, connect_timeout=10) + ['-Nf', f'ubuntu@{host}'],
+            capture_output=True, text=True
+        )
+
+
 # Files/folders to deploy to IONOS (PHP client)
 IONOS_DEPLOY_FILES = [
     'index.php',
@@ -53,32 +128,67 @@ IONOS_EXCLUDE = [
     '*.pyc',
 ]
 
+
+def _translate_exclude(pattern):
+    """Map one IONOS_EXCLUDE entry onto a regex fragment."""
+    if pattern.endswith('/'):
+        # Whole path component only: '.git/' must not match '.github/'
+        return r'(^|/)' + re.escape(pattern[:-1]) + r'(/|$)'
+    if pattern.startswith('*'):
+        return re.escape(pattern[1:]) + '$'
+    return re.escape(pattern)
+
+
+# Compiled once — _should_exclude runs on every path visited during the
+# IONOS walk, so one C-level regex scan beats a Python loop per path
+_EXCLUDE_RE = re.compile('|'.join(_translate_exclude(p) for p in IONOS_EXCLUDE))
+
+
+def _should_exclude(path):
+    return bool(_EXCLUDE_RE.search(str(path).replace('\\', '/')))
+
+# Parsed credentials, cached for the lifetime of the process
+_CREDS_CACHE = None
+
+
 def load_credentials():
-    """Load credentials from files"""
-    creds = {}
+    """Load credentials from environment variables or sftp.txt (cached)"""
+    global _CREDS_CACHE
+    if _CREDS_CACHE is not None:
+        return _CREDS_CACHE
+
+    # WMT_SFTP_* env vars take precedence — lets tooling (and CI) skip
+    # sftp.txt entirely
+    env_creds = {
+        'sftp_host': os.environ.get('WMT_SFTP_HOST'),
+        'sftp_user': os.environ.get('WMT_SFTP_USER'),
+        'sftp_pass': os.environ.get('WMT_SFTP_PASS'),
+    }
+    if all(env_creds.values()):
+        _CREDS_CACHE = env_creds
+        return env_creds
 
-    # SFTP credentials
+    creds = {}
     sftp_file = BASE_DIR / 'sftp.txt'
     if sftp_file.exists():
         content = sftp_file.read_text().strip()
-        # Parse: host <host> user <user> pass <pass>
-        parts = content.split()
-        for i, part in enumerate(parts):
-            if part == 'host' and i + 1 < len(parts):
-                creds['sftp_host'] = parts[i + 1]
-            elif part == 'user' and i + 1 < len(parts):
-                creds['sftp_user'] = parts[i + 1]
-            elif part == 'pass' and i + 1 < len(parts):
-                creds['sftp_pass'] = ' '.join(parts[i + 1:])
-                break
-
+        # Parse: host <host> user <user> pass <pass> — keys may appear in
+        # any order; pass consumes the remainder, so spaces in it survive
+        for key, pattern in (('sftp_host', r'\bhost\s+(\S+)'),
+                             ('sftp_user', r'\buser\s+(\S+)'),
+                             ('sftp_pass', r'\bpass\s+(.+)')):
+            match = re.search(pattern, content, re.DOTALL)
+            if match:
+                creds[key] = match.group(1)
+
+    _CREDS_CACHE = creds
     return creds
 
 def deploy_lightsail(target='server', force_bridge=False):
     """Deploy to Lightsail via SSH"""
-    ssh_key = Path.home() / '.ssh' / 'wmt-client-socket.pem'
-    host = '3.14.128.194'
-    ssh_cmd = f'ssh -i "{ssh_key}" -o StrictHostKeyChecking=no ubuntu@{host}'
+    ssh_key = LIGHTSAIL_KEY
+    host = LIGHTSAIL_HOST
+    ssh_cmd = _ssh_cmd(ssh_key, host)
 
     if target == 'bridge':
         print("\n=== Deploying bridge.js to Lightsail (SSH) ===")
@@ -87,8 +197,8 @@ def deploy_lightsail(target='server', force_bridge=False):
 
         # Check how many active sessions bridge is holding
         check = subprocess.run(
-            f'{ssh_cmd} "sudo journalctl -u wmt-bridge -n 1 --no-pager -o cat"',
-            shell=True, capture_output=True, text=True
+            ssh_cmd + ['sudo journalctl -u wmt-bridge -n 1 --no-pager -o cat'],
+            capture_output=True, text=True
         )
         last_line = check.stdout.strip()
         if 'Sessions:' in last_line:
@@ -103,17 +213,17 @@ def deploy_lightsail(target='server', force_bridge=False):
         if not local_file.exists():
             print("ERROR: glitch/bridge.js not found")
             return False
-        result = subprocess.run(
-            f'scp -i "{ssh_key}" "{local_file}" ubuntu@{host}:/tmp/bridge.js',
-            shell=True, capture_output=True, text=True
-        )
-        if result.returncode != 0:
-            print(f"SCP failed: {result.stderr}")
-            return False
-        result = subprocess.run(
-            f'{ssh_cmd} "sudo cp /tmp/bridge.js /opt/wmt/bridge.js && sudo chown wmt:wmt /opt/wmt/bridge.js && sudo systemctl restart wmt-bridge"',
-            shell=True, capture_output=True, text=True
-        )
+        # Stream the file over the install session's stdin — one remote
+        # session instead of scp + ssh, and no Python-side buffering
+        remote = ('cat > /tmp/bridge.js'
+                  ' && sudo cp /tmp/bridge.js /opt/wmt/bridge.js'
+                  ' && sudo chown wmt:wmt /opt/wmt/bridge.js'
+                  ' && sudo systemctl restart wmt-bridge')
+        with open(local_file, 'rb') as payload:
+            result = subprocess.run(
+                ssh_cmd + [remote],
+                stdin=payload, capture_output=True, text=True
+            )
         if result.returncode != 0:
             print(f"Deploy failed: {result.stderr}")
             return False
@@ -126,28 +236,27 @@ def deploy_lightsail(target='server', force_bridge=False):
     if not local_file.exists():
         print("ERROR: glitch/server.js not found")
         return False
-    result = subprocess.run(
-        f'scp -i "{ssh_key}" "{local_file}" ubuntu@{host}:/tmp/server.js',
-        shell=True, capture_output=True, text=True
-    )
-    if result.returncode != 0:
-        print(f"SCP failed: {result.stderr}")
-        return False
-    result = subprocess.run(
-        f'{ssh_cmd} "sudo cp /tmp/server.js /opt/wmt/server.js && sudo chown wmt:wmt /opt/wmt/server.js && sudo systemctl restart wmt-server"',
-        shell=True, capture_output=True, text=True
-    )
+    # Upload, install, restart and verify in one remote session: the file
+    # streams over the session's stdin (no scp subprocess, no second
+    # handshake, never read into Python memory), then the post-restart
+    # settle wait happens server-side
+    remote = ('cat > /tmp/server.js'
+              ' && sudo cp /tmp/server.js /opt/wmt/server.js'
+              ' && sudo chown wmt:wmt /opt/wmt/server.js'
+              ' && sudo systemctl restart wmt-server'
+              ' && sleep 2'
+              ' && { systemctl is-active wmt-server || true; }')
+    with open(local_file, 'rb') as payload:
+        result = subprocess.run(
+            ssh_cmd + [remote],
+            stdin=payload, capture_output=True, text=True
+        )
     if result.returncode != 0:
         print(f"Deploy failed: {result.stderr}")
         return False
 
-    # Verify it started
-    time.sleep(2)
-    result = subprocess.run(
-        f'{ssh_cmd} "systemctl is-active wmt-server"',
-        shell=True, capture_output=True, text=True
-    )
-    status = result.stdout.strip()
+    # Last line of output is the is-active status
+    status = result.stdout.strip().splitlines()[-1].strip() if result.stdout.strip() else ''
     if status == 'active':
         print("server.js deployed and service running.")
     else:
@@ -157,8 +266,8 @@ def deploy_lightsail(target='server', force_bridge=False):
 def deploy_test_server():
     """Deploy server.js to the test sandbox. Returns True on success, False on failure."""
     print("\n=== Deploying server.js to test sandbox ===")
-    ssh_key = Path.home() / '.ssh' / 'test-mud.pem'
-    host = '18.225.235.28'
+    ssh_key = TEST_KEY
+    host = TEST_HOST
 
     if not ssh_key.exists():
         print("  ERROR: test-mud.pem not found")
@@ -169,11 +278,11 @@ def deploy_test_server():
         print("  ERROR: glitch/server.js not found")
         return False
 
-    ssh_cmd = f'ssh -i "{ssh_key}" -o StrictHostKeyChecking=no -o ConnectTimeout=10 ubuntu@{host}'
+    ssh_cmd = _ssh_cmd(ssh_key, host, connect_timeout=10)
 
     result = subprocess.run(
-        f'scp -i "{ssh_key}" -o StrictHostKeyChecking=no -o ConnectTimeout=10 "{local_file}" ubuntu@{host}:/tmp/server.js',
-        shell=True, capture_output=True, text=True
+        _scp_cmd(ssh_key, local_file, '/tmp/server.js', host, connect_timeout=10),
+        capture_output=True, text=True
     )
     if result.returncode != 0:
         print(f"  SCP failed: {result.stderr.strip()}")
@@ -192,12 +301,12 @@ def deploy_test_server():
     patch_file = BASE_DIR / '.deploy_patch.sh'
     patch_file.write_text(patch_content, newline='\n')
     subprocess.run(
-        f'scp -i "{ssh_key}" -o StrictHostKeyChecking=no -o ConnectTimeout=10 "{patch_file}" ubuntu@{host}:/tmp/deploy_patch.sh',
-        shell=True, capture_output=True, text=True
+        _scp_cmd(ssh_key, patch_file, '/tmp/deploy_patch.sh', host, connect_timeout=10),
+        capture_output=True, text=True
     )
     result = subprocess.run(
-        f'{ssh_cmd} "bash /tmp/deploy_patch.sh"',
-        shell=True, capture_output=True, text=True
+        ssh_cmd + ['bash /tmp/deploy_patch.sh'],
+        capture_output=True, text=True
     )
     patch_file.unlink(missing_ok=True)
     if result.returncode != 0:
@@ -207,8 +316,8 @@ def deploy_test_server():
     # Wait for service to start, then verify
     time.sleep(2)
     result = subprocess.run(
-        f'{ssh_cmd} "systemctl is-active wmt-server"',
-        shell=True, capture_output=True, text=True
+        ssh_cmd + ['systemctl is-active wmt-server'],
+        capture_output=True, text=True
     )
     status = result.stdout.strip()
     if status == 'active':
@@ -222,9 +331,7 @@ def deploy_test_server():
 def run_test_suites():
     """Run all WMT test suites on sandbox. Returns (total_passed, total_failed, details)."""
     print("\n=== Running test suites on sandbox ===")
-    ssh_key = Path.home() / '.ssh' / 'test-mud.pem'
-    host = '18.225.235.28'
-    ssh_cmd = f'ssh -i "{ssh_key}" -o StrictHostKeyChecking=no -o ConnectTimeout=10 ubuntu@{host}'
+    ssh_cmd = _ssh_cmd(TEST_KEY, TEST_HOST, connect_timeout=10)
 
     # Known test failures that are accepted and should not block deploy.
     # T11: Alias recursion via #if — server doesn't evaluate #if, so recursive
@@ -237,29 +344,57 @@ def run_test_suites():
         ('Triggers',  'test_trigger_compare.js'),
     ]
 
-    total_passed = 0
-    total_failed = 0
+    # One SSH session and one node-per-suite on the remote side: the suites
+    # are backgrounded on the sandbox (still parallel), each under its own
+    # timeout(1). Each wait is followed immediately by that suite's marker
+    # and transcript, so output flows back suite-by-suite as they finish
+    # instead of one burst after the slowest. Saves two SSH channel setups
+    # and keeps the 60s budget enforced remotely even if a suite hangs.
+    remote = ['cd /opt/wmt/tests']
+    for i, (label, script) in enumerate(suites):
+        remote.append(f'timeout 60 node {script} ws://localhost:3000 > /tmp/wmt_suite_{i}.out 2>&1 & p{i}=$!')
+    for i in range(len(suites)):
+        remote.append(f'rc{i}=0; wait $p{i} || rc{i}=$?')
+        remote.append(f'echo "===SUITE {i} rc=$rc{i}==="')
+        remote.append(f'cat /tmp/wmt_suite_{i}.out')
+    remote_script = '\n'.join(remote) + '\n'
+
+    # Stream each suite's transcript as it lands (ServerAlive in _ssh_opts
+    # bounds this read loop if the connection stalls silently)
+    proc = subprocess.Popen(
+        ssh_cmd + ['bash -s'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        text=True, bufsize=1
+    )
+    proc.stdin.write(remote_script)
+    proc.stdin.close()
+    lines = []
+    for line in proc.stdout:
+        lines.append(line)
+        print(f"  {line.rstrip()}")
+    proc.wait()
+    output = ''.join(lines)
+
+    # Split back into per-suite sections on the markers
+    sections = re.split(r'===SUITE (\d+) rc=(\d+)===\n?', output)
+    by_index = {}
+    for i in range(1, len(sections) - 2, 3):
+        by_index[int(sections[i])] = (int(sections[i + 1]), sections[i + 2])
+
     details = []
+    for i, (label, script) in enumerate(suites):
+        returncode, body = by_index.get(i, (1, ''))
 
-    for label, script in suites:
-        try:
-            result = subprocess.run(
-                f'{ssh_cmd} "cd /opt/wmt/tests && node {script} ws://localhost:3000"',
-                shell=True, capture_output=True, text=True, timeout=60
-            )
-        except subprocess.TimeoutExpired:
-            details.append((label, script, 0, 0, 'TIMEOUT'))
-            total_failed += 1
+        if returncode == 124:  # timeout(1)'s exit code
+            details.append((label, script, 0, 1, 'TIMEOUT'))
             continue
 
-        output = result.stdout + result.stderr
-
         # Parse "Results: X passed, Y failed" or "=== Results: X passed, Y failed ==="
-        match = re.search(r'(\d+)\s+passed,\s+(\d+)\s+failed', output)
+        match = re.search(r'(\d+)\s+passed,\s+(\d+)\s+failed', body)
         if match:
             passed = int(match.group(1))
             failed = int(match.group(2))
-        elif result.returncode == 0:
+        elif returncode == 0:
             # No parseable results but exited OK — count as 1 pass
             passed = 1
             failed = 0
@@ -268,11 +403,12 @@ def run_test_suites():
             passed = 0
             failed = 1
 
-        total_passed += passed
-        total_failed += failed
         status = 'PASS' if failed == 0 else 'FAIL'
         details.append((label, script, passed, failed, status))
 
+    total_passed = sum(d[2] for d in details)
+    total_failed = sum(d[3] for d in details)
+
     # Print summary table
     for label, script, passed, failed, status in details:
         icon = 'OK' if status == 'PASS' else ('FAIL' if status == 'FAIL' else '??')
@@ -291,10 +427,170 @@ def run_test_suites():
     return total_passed, unexpected_failures, details
 
 
-def deploy_ionos():
+# Cached SFTP connections, keyed by (host, user). Repeated deploy calls in
+# one process (batch tooling, REPL) skip the SSH key exchange + auth.
+_SFTP_POOL = {}
+
+# Remote directories already confirmed/created this process. Lives as long
+# as the pooled transport, so repeat deploys skip the probes entirely.
+_KNOWN_REMOTE_DIRS = set()
+
+
+def _get_sftp(host, user, password):
+    """Return a cached (transport, sftp) pair, reconnecting if the old one died."""
+    import paramiko
+
+    cached = _SFTP_POOL.get((host, user))
+    if cached and cached[0].is_active():
+        return cached
+
+    transport = paramiko.Transport((host, 22))
+    # Big window + no mid-transfer rekey: paramiko otherwise stalls the
+    # write pipeline waiting for window/rekey round trips
+    transport.default_window_size = 2 ** 31 - 1
+    transport.packetizer.REKEY_BYTES = 1 << 40
+    # Text payload (PHP/JS/CSS/.htaccess) compresses ~3-5x; prefer the
+    # AES-GCM fast path on AES-NI hosts, with CTR fallbacks for the server
+    transport.use_compression(True)
+    transport.get_security_options().ciphers = (
+        'aes128-gcm@openssh.com', 'aes256-gcm@openssh.com',
+        'aes128-ctr', 'aes256-ctr',
+    )
+    transport.connect(username=user, password=password)
+    transport.set_keepalive(30)
+    sftp = paramiko.SFTPClient.from_transport(transport)
+    _SFTP_POOL[(host, user)] = (transport, sftp)
+    return transport, sftp
+
+
+def _put_pipelined(client, local_path, remote_path):
+    """Upload one file with pipelined writes.
+
+    sftp.put waits for the server ack after every 32 KiB block;
+    set_pipelined keeps the requests in flight, which is the difference
+    between RTT-bound and bandwidth-bound on the larger assets/ bundles.
+
+    Writes are capped at 32 KiB — paramiko's safe request size; servers
+    fragment anything larger, which stalls the pipeline — while the local
+    file is read through a 1 MiB buffer so disk I/O stays coarse.
+    """
+    with open(local_path, 'rb', buffering=1 << 20) as src, \
+            client.file(remote_path, 'wb') as dst:
+        dst.set_pipelined(True)
+        while True:
+            chunk = src.read(32768)
+            if not chunk:
+                break
+            dst.write(chunk)
+
+
+@atexit.register
+def _close_sftp_pool():
+    for transport, sftp in _SFTP_POOL.values():
+        try:
+            sftp.close()
+            transport.close()
+        except Exception:
+            pass
+
+
+def _deploy_ionos_rsync(creds):
+    """Push the IONOS payload with rsync's delta transfer (one stream, only
+    changed blocks on the wire). Needs rsync+sshpass locally and shell access
+    on the host — IONOS shared hosting only guarantees SFTP, so this is the
+    opt-in --rsync path. Returns True on success, False to fall back to SFTP."""
+    if not (shutil.which('rsync') and shutil.which('sshpass')):
+        print("  rsync/sshpass not found locally, falling back to SFTP")
+        return False
+
+    cmd = ['rsync', '-az', '--relative']
+    for exc in IONOS_EXCLUDE:
+        cmd += ['--exclude', exc]
+    cmd += IONOS_DEPLOY_FILES
+    cmd += ['-e', 'sshpass -e ssh -p 22 -o StrictHostKeyChecking=no',
+            f"{creds['sftp_user']}@{creds['sftp_host']}:"]
+
+    # Pass the password via the environment (sshpass -e), not argv
+    env = dict(os.environ, SSHPASS=creds['sftp_pass'])
+    result = subprocess.run(cmd, capture_output=True, text=True,
+                            cwd=str(BASE_DIR), env=env)
+    if result.returncode != 0:
+        print(f"  rsync failed ({result.stderr.strip()}), falling back to SFTP")
+        return False
+
+    print("Deployed to IONOS via rsync.")
+    return True
+
+
+async def _deploy_ionos_async(creds, files, dirs, manifest):
+    """Upload the planned files over one asyncssh connection.
+
+    asyncssh's SFTP client pipelines block requests internally, so eight
+    puts in flight keep the link busy without threads. Returns
+    (uploaded, skipped); raises on connection/auth errors so the caller
+    can fall back to paramiko.
+    """
+    import asyncssh
+
+    async with asyncssh.connect(
+            creds['sftp_host'], username=creds['sftp_user'],
+            password=creds['sftp_pass'], known_hosts=None,
+            compression_algs=['zlib@openssh.com', 'zlib']) as conn:
+        async with conn.start_sftp_client() as sftp:
+            for remote_dir in dirs:
+                try:
+                    await sftp.makedirs(remote_dir, exist_ok=True)
+                except (OSError, asyncssh.SFTPError):
+                    pass  # exists with odd perms etc. — the put will tell us
+
+            uploaded = 0
+            skipped = 0
+            limit = asyncio.Semaphore(8)
+
+            async def upload_one(local_full, remote_full, st):
+                nonlocal uploaded, skipped
+                # Unchanged since the last successful deploy — skip for free
+                if manifest.get(remote_full) == [st.st_mtime_ns, st.st_size]:
+                    skipped += 1
+                    return
+                async with limit:
+                    # Skip unchanged files (same size as remote)
+                    try:
+                        attrs = await sftp.stat(remote_full)
+                        if attrs.size == st.st_size:
+                            manifest[remote_full] = [st.st_mtime_ns, st.st_size]
+                            skipped += 1
+                            return
+                    except asyncssh.SFTPError:
+                        pass  # Remote doesn't exist, upload it
+                    print(f"  Uploading {remote_full}...")
+                    # Larger blocks + deep request pipeline per transfer
+                    await sftp.put(str(local_full), remote_full,
+                                   block_size=256 * 1024, max_requests=128)
+                    manifest[remote_full] = [st.st_mtime_ns, st.st_size]
+                    uploaded += 1
+
+            await asyncio.gather(*(upload_one(*job) for job in files))
+
+    return uploaded, skipped
+
+
+def deploy_ionos(use_rsync=False, force=False):
     """Deploy changed PHP client files to IONOS via SFTP (skips unchanged files)"""
     print("\n=== Deploying to IONOS (SFTP) ===")
 
+    # Per-file manifest from the last successful deploy:
+    # remote_path -> [st_mtime_ns, st_size]. A match skips the file without
+    # any remote round trip; --force ignores it. (Replaces the older
+    # whole-deploy timestamp stamp, which couldn't tell files apart.)
+    manifest_file = BASE_DIR / 'deploy_cache.json'
+    manifest = {}
+    if not force and manifest_file.exists():
+        try:
+            manifest = json.loads(manifest_file.read_text())
+        except (ValueError, OSError):
+            manifest = {}
+
     try:
         import paramiko
     except ImportError:
@@ -306,14 +602,80 @@ def deploy_ionos():
         print("ERROR: Missing SFTP credentials in sftp.txt")
         return False
 
+    if use_rsync and _deploy_ionos_rsync(creds):
+        return True
+
     remote_base = ''  # Root directory on IONOS (subdomain root is /client)
 
+    # --- Pass 1: walk the deploy list into a flat upload plan (purely
+    # local, shared by both upload backends). Iterative os.scandir walk:
+    # DirEntry caches the is_file/is_dir stat data, and relative paths are
+    # plain string joins instead of a Path.relative_to call per entry.
+    files = []  # (local_full, remote_full, stat_result)
+    dirs = []   # remote dirs that must exist, parents before children
+
+    def remote_for(rel):
+        # Convert Windows backslashes to forward slashes for SFTP
+        rel = rel.replace('\\', '/')
+        return f"{remote_base}/{rel}" if remote_base else rel
+
+    pending = deque()
+    for item in IONOS_DEPLOY_FILES:
+        if _should_exclude(item):
+            continue
+        local_full = BASE_DIR / item
+        rel = item.rstrip('/')
+        if local_full.is_file():
+            files.append((local_full, remote_for(rel), local_full.stat()))
+        elif local_full.is_dir():
+            dirs.append(remote_for(rel))
+            pending.append((str(local_full), rel))
+
+    while pending:
+        local_dir, rel_prefix = pending.popleft()
+        with os.scandir(local_dir) as entries:
+            for entry in entries:
+                rel = f"{rel_prefix}/{entry.name}"
+                if _should_exclude(rel):
+                    continue
+                if entry.is_file(follow_symlinks=False):
+                    # entry.stat() reuses the data scandir already fetched;
+                    # carrying it in the plan means uploads never re-stat
+                    files.append((Path(entry.path), remote_for(rel), entry.stat()))
+                elif entry.is_dir(follow_symlinks=False):
+                    dirs.append(remote_for(rel))
+                    pending.append((entry.path, rel))
+
+    # Parents of single-file entries (e.g. data/users/.htaccess) aren't
+    # walked as directories above — make sure they exist too
+    for _, remote_full, _ in files:
+        parent = '/'.join(remote_full.split('/')[:-1])
+        if parent and parent not in dirs:
+            dirs.append(parent)
+
+    # Prefer asyncssh when installed: its SFTP client pipelines many small
+    # files over one connection with windowed flow control, which beats
+    # thread-per-channel paramiko on this latency-bound payload
+    try:
+        import asyncssh  # noqa: F401
+        has_asyncssh = True
+    except ImportError:
+        has_asyncssh = False
+
+    if has_asyncssh:
+        try:
+            uploaded, skipped = asyncio.run(
+                _deploy_ionos_async(creds, files, dirs, manifest))
+            manifest_file.write_text(json.dumps(manifest))
+            print(f"Uploaded {uploaded} files to IONOS ({skipped} unchanged, skipped).")
+            return True
+        except Exception as e:
+            print(f"  asyncssh deploy failed ({e}), falling back to paramiko")
+
     try:
-        # Connect
+        # Connect (reuses a cached transport if this process deployed before)
         print(f"Connecting to {creds['sftp_host']}...")
-        transport = paramiko.Transport((creds['sftp_host'], 22))
-        transport.connect(username=creds['sftp_user'], password=creds['sftp_pass'])
-        sftp = paramiko.SFTPClient.from_transport(transport)
+        transport, sftp = _get_sftp(creds['sftp_host'], creds['sftp_user'], creds['sftp_pass'])
 
         # Ensure remote base exists (skip if root)
         if remote_base:
@@ -322,90 +684,89 @@ def deploy_ionos():
             except FileNotFoundError:
                 sftp.mkdir(remote_base)
 
-        uploaded = 0
-        skipped = 0
-
-        def should_exclude(path):
-            path_str = str(path)
-            for exc in IONOS_EXCLUDE:
-                if exc.endswith('/'):
-                    if exc[:-1] in path_str:
-                        return True
-                elif exc.startswith('*'):
-                    if path_str.endswith(exc[1:]):
-                        return True
-                elif exc in path_str:
-                    return True
-            return False
-
-        def needs_upload(local_full, remote_full):
-            """Check if local file differs from remote (by size)"""
+        # --- Pass 2: create remote directories (main thread, so uploads
+        # never race a missing parent). The whole tree is known up front,
+        # so expand every ancestor once, sort shallow-first, and blind-
+        # mkdir each: one RTT per directory not yet seen this process
+        # (_KNOWN_REMOTE_DIRS), zero stat probes.
+        needed = set()
+        for remote_dir in dirs:
+            parts = remote_dir.split('/')
+            for i in range(1, len(parts) + 1):
+                ancestor = '/'.join(parts[:i])
+                if ancestor:
+                    needed.add(ancestor)
+
+        for remote_dir in sorted(needed - _KNOWN_REMOTE_DIRS,
+                                 key=lambda p: p.count('/')):
             try:
-                remote_stat = sftp.stat(remote_full)
-                local_size = local_full.stat().st_size
-                return local_size != remote_stat.st_size
-            except (FileNotFoundError, IOError):
-                return True  # Remote doesn't exist, upload it
-
-        def upload_path(local_path, remote_path):
-            nonlocal uploaded, skipped
-
-            if should_exclude(local_path):
-                return
-
-            local_full = BASE_DIR / local_path
-            # Convert Windows backslashes to forward slashes for SFTP
-            remote_path_unix = remote_path.replace('\\', '/')
-            if remote_base:
-                remote_full = f"{remote_base}/{remote_path_unix}"
-            else:
-                remote_full = remote_path_unix
-
-            if local_full.is_file():
-                # Skip unchanged files
-                if not needs_upload(local_full, remote_full):
-                    skipped += 1
-                    return
-
-                # Ensure parent directory exists
-                remote_dir = '/'.join(remote_full.split('/')[:-1])
-                if remote_dir:  # Only check/create if not in root
+                sftp.mkdir(remote_dir)
+            except IOError:
+                pass  # already exists
+            _KNOWN_REMOTE_DIRS.add(remote_dir)
+
+        # --- Pass 3: upload concurrently. SSH channels multiplex over the
+        # one transport, so each worker thread gets its own SFTP channel
+        # (paramiko channels aren't thread-safe) and per-file RTTs overlap.
+        worker = threading.local()
+
+        def worker_sftp():
+            if getattr(worker, 'sftp', None) is None:
+                worker.sftp = paramiko.SFTPClient.from_transport(transport)
+            return worker.sftp
+
+        # Remote sizes come from one listdir_attr per directory rather than
+        # one stat per file — a single RTT returns every entry's attributes
+        remote_sizes = {}
+        listed_dirs = set()
+        remote_lock = threading.Lock()
+
+        def remote_size(client, remote_full):
+            remote_dir, _, _ = remote_full.rpartition('/')
+            with remote_lock:
+                if remote_dir not in listed_dirs:
                     try:
-                        sftp.stat(remote_dir)
-                    except FileNotFoundError:
-                        # Create parent directories
-                        parts = remote_dir.split('/')
-                        for i in range(1, len(parts) + 1):
-                            path_to_check = '/'.join(parts[:i])
-                            if path_to_check:  # Skip empty paths
-                                try:
-                                    sftp.stat(path_to_check)
-                                except FileNotFoundError:
-                                    sftp.mkdir(path_to_check)
-
-                print(f"  Uploading {remote_path_unix}...")
-                sftp.put(str(local_full), remote_full)
-                uploaded += 1
-
-            elif local_full.is_dir():
-                # Create remote directory
-                try:
-                    sftp.stat(remote_full)
-                except FileNotFoundError:
-                    sftp.mkdir(remote_full)
-
-                # Upload contents
-                for item in local_full.iterdir():
-                    rel_path = item.relative_to(BASE_DIR)
-                    upload_path(str(rel_path), str(rel_path))
+                        for attr in client.listdir_attr(remote_dir or '.'):
+                            key = f"{remote_dir}/{attr.filename}" if remote_dir else attr.filename
+                            remote_sizes[key] = attr.st_size
+                    except (FileNotFoundError, IOError):
+                        pass  # Directory missing/unreadable — treat files as absent
+                    listed_dirs.add(remote_dir)
+            return remote_sizes.get(remote_full)
+
+        def needs_upload(client, st, remote_full):
+            """Check if local file differs from remote (by size)"""
+            size = remote_size(client, remote_full)
+            return size is None or size != st.st_size
+
+        def upload_one(job):
+            local_full, remote_full, st = job
+            # Unchanged since the last successful deploy — skip for free
+            if manifest.get(remote_full) == [st.st_mtime_ns, st.st_size]:
+                return False
+            client = worker_sftp()
+            # Skip unchanged files (and remember them for next time)
+            if not needs_upload(client, st, remote_full):
+                manifest[remote_full] = [st.st_mtime_ns, st.st_size]
+                return False
+            print(f"  Uploading {remote_full}...")
+            _put_pipelined(client, str(local_full), remote_full)
+            manifest[remote_full] = [st.st_mtime_ns, st.st_size]
+            return True
 
-        # Upload each deploy file/folder
-        for item in IONOS_DEPLOY_FILES:
-            upload_path(item, item)
+        uploaded = 0
+        skipped = 0
+        # No point opening more channels than there are files to push
+        with ThreadPoolExecutor(max_workers=min(8, max(1, len(files)))) as executor:
+            for did_upload in executor.map(upload_one, files):
+                if did_upload:
+                    uploaded += 1
+                else:
+                    skipped += 1
 
-        sftp.close()
-        transport.close()
+        # Leave the transport open — _close_sftp_pool() handles it at exit
 
+        manifest_file.write_text(json.dumps(manifest))
         print(f"Uploaded {uploaded} files to IONOS ({skipped} unchanged, skipped).")
         return True
 
@@ -415,30 +776,50 @@ def deploy_ionos():
 
 def git_commit_before_deploy():
     """Auto-commit tracked changes before deploying (for easy rollback)"""
-    # Check for any staged or unstaged changes to tracked files
+    # Fast path: git diff --quiet stops at the first difference and prints
+    # nothing, so the common re-deploy-with-no-edits case skips the
+    # porcelain parse below entirely
+    if subprocess.run(
+        ['git', 'diff', '--quiet', 'HEAD', '--'], cwd=str(BASE_DIR)
+    ).returncode == 0:
+        print("No tracked changes to commit.")
+        return
+
+    # Check for any staged or unstaged changes to tracked files.
+    # -uno skips the untracked-file scan entirely (node_modules,
+    # __pycache__, ...), which is the slow part on a big working tree.
+    # porcelain v2 with -z gives NUL-delimited records, so paths come back
+    # verbatim — no quote stripping or rename-arrow splitting.
     result = subprocess.run(
-        'git status --porcelain',
-        shell=True, capture_output=True, text=True, cwd=str(BASE_DIR)
+        ['git', 'status', '--porcelain=v2', '-z', '-uno'],
+        capture_output=True, text=True, cwd=str(BASE_DIR)
     )
     if result.returncode != 0:
         print("WARNING: git status failed, skipping auto-commit")
         return
 
-    lines = result.stdout.strip().splitlines() if result.stdout.strip() else []
-    # Filter to only tracked changes (M, D, R, etc. — skip ?? untracked)
-    tracked_changes = [l for l in lines if not l.startswith('??')]
-    if not tracked_changes:
+    # Record types: '1' = changed, '2' = renamed/copied (followed by a
+    # separate NUL record holding the original path), 'u' = unmerged
+    changed_files = []
+    skip_next = False
+    for record in result.stdout.split('\0'):
+        if skip_next:
+            skip_next = False
+            continue
+        if not record:
+            continue
+        if record[0] == '1':
+            changed_files.append(record.split(' ', 8)[8])
+        elif record[0] == '2':
+            changed_files.append(record.split(' ', 9)[9])
+            skip_next = True
+        elif record[0] == 'u':
+            changed_files.append(record.split(' ', 10)[10])
+
+    if not changed_files:
         print("No tracked changes to commit.")
         return
 
-    # Build a summary of what changed
-    changed_files = []
-    for line in tracked_changes:
-        # Format: "XY filename" or "XY filename -> newname" (renames)
-        # Skip 2-char status, strip whitespace (handles tabs/spaces)
-        filepath = line[2:].lstrip().strip('"').split(' -> ')[-1].strip('"')
-        changed_files.append(filepath)
-
     # Summarize by area
     areas = set()
     for f in changed_files:
@@ -470,11 +851,10 @@ def git_commit_before_deploy():
     print(f"  Changed files: {', '.join(changed_files)}")
     print(f"  Commit message: {msg}")
 
-    # Stage tracked changes only (no untracked files)
-    subprocess.run('git add -u', shell=True, cwd=str(BASE_DIR))
-    # Commit
+    # commit -a stages tracked changes and commits in one git invocation
+    # (untracked files are still never picked up)
     result = subprocess.run(
-        ['git', 'commit', '-m', msg],
+        ['git', 'commit', '-a', '-m', msg],
         capture_output=True, text=True, cwd=str(BASE_DIR)
     )
     if result.returncode == 0:
@@ -485,15 +865,19 @@ def git_commit_before_deploy():
 
 def log_deploy(target, commit_hash, success):
     """Append a line to the deploy log on Lightsail (always, even with no code changes)"""
-    ssh_key = Path.home() / '.ssh' / 'wmt-client-socket.pem'
-    host = '3.14.128.194'
-    ssh_cmd = f'ssh -i "{ssh_key}" -o StrictHostKeyChecking=no ubuntu@{host}'
+    ssh_cmd = _ssh_cmd(LIGHTSAIL_KEY, LIGHTSAIL_HOST)
     ts = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
     status = 'OK' if success else 'FAILED'
     entry = f'{ts} target={target} commit={commit_hash} status={status}'
+    # Feed the entry via stdin so no shell (local or remote) re-parses it.
+    # Plain append works once the log is group-writable (one-time setup:
+    # sudo chgrp ubuntu /var/log/wmt/deploy.log && sudo chmod g+w <log>),
+    # skipping the sudo+tee+pipe process spawns; otherwise fall back.
+    remote = ('entry=$(cat); printf \'%s\\n\' "$entry" >> /var/log/wmt/deploy.log 2>/dev/null'
+              ' || printf \'%s\\n\' "$entry" | sudo tee -a /var/log/wmt/deploy.log > /dev/null')
     subprocess.run(
-        f'{ssh_cmd} "echo \'{entry}\' | sudo tee -a /var/log/wmt/deploy.log > /dev/null"',
-        shell=True, capture_output=True, text=True
+        ssh_cmd + [remote],
+        capture_output=True, text=True, input=entry + '\n'
     )
     print(f"  Deploy logged: {entry}")
 
@@ -505,7 +889,8 @@ def main():
     parser.add_argument('--list', action='store_true', help='List files that would be deployed')
     parser.add_argument('--no-commit', action='store_true', help='Skip auto-commit before deploy')
     parser.add_argument('--yes', action='store_true', help='Confirm bridge deploy (required — bridge restart kills ALL MUD connections)')
-    parser.add_argument('--force', action='store_true', help='Deploy to production even if sandbox tests fail')
+    parser.add_argument('--force', action='store_true', help='Deploy even if sandbox tests fail; also ignores the IONOS skip manifest')
+    parser.add_argument('--rsync', action='store_true', help='Use rsync for the IONOS deploy (needs rsync+sshpass and shell access on the host)')
 
     args = parser.parse_args()
 
@@ -518,6 +903,14 @@ def main():
         print("  bridge.js (bridge target)")
         return
 
+    # Open one multiplexed SSH connection per host; all ssh/scp below reuse
+    # it, and ControlPersist keeps it warm for the next deploy run
+    _open_ssh_masters()
+    _run_deploy(args)
+
+
+def _run_deploy(args):
+    """The deploy pipeline proper (split out so main() can manage SSH masters)."""
     # --- Test-only target ---
     if args.target == 'test':
         if not deploy_test_server():
@@ -537,7 +930,7 @@ def main():
 
     # Get current commit hash for deploy log
     commit_result = subprocess.run(
-        'git rev-parse --short HEAD', shell=True,
+        ['git', 'rev-parse', '--short', 'HEAD'],
         capture_output=True, text=True, cwd=str(BASE_DIR)
     )
     commit_hash = commit_result.stdout.strip() if commit_result.returncode == 0 else 'unknown'
@@ -567,11 +960,14 @@ def main():
                 print("  Aborting production deploy. Use --force to override.")
                 sys.exit(1)
 
-        # Deploy to production
-        if not deploy_lightsail('server'):
-            success = False
-        if not deploy_ionos():
-            success = False
+        # Deploy to production. Lightsail and IONOS are independent hosts,
+        # so overlap their network latency.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(deploy_lightsail, 'server'),
+                       executor.submit(deploy_ionos, use_rsync=args.rsync,
+                                       force=args.force)]
+            if not all(f.result() for f in futures):
+                success = False
 
     elif args.target == 'lightsail':
         if not deploy_lightsail('server'):
@@ -583,16 +979,24 @@ def main():
             success = False
 
     elif args.target == 'ionos':
-        if not deploy_ionos():
+        if not deploy_ionos(use_rsync=args.rsync, force=args.force):
             success = False
 
-    # Log every deploy to Lightsail for audit trail
-    log_deploy(args.target, commit_hash, success)
+    # Log every deploy to Lightsail for audit trail. Fire-and-forget: the
+    # append is one SSH round trip we don't need to block the summary on,
+    # and a network blip here shouldn't fail the run.
+    log_thread = threading.Thread(target=log_deploy,
+                                  args=(args.target, commit_hash, success),
+                                  daemon=True)
+    log_thread.start()
 
     if success:
         print("\n=== Deployment complete! ===")
     else:
         print("\n=== Deployment had errors ===")
+
+    log_thread.join(timeout=5)
+    if not success:
         sys.exit(1)
 
 if __name__ == '__main__':